@@ -0,0 +1,80 @@
+# cython: language_level=3, boundscheck=False, wraparound=False, cdivision=True
+# Optional C version of the Gustavson SpGEMM kernel in sparse_matrix.py (_spgemm_csr).
+# Sparse_Matrix.__mul__ uses it when it is built; build it next to sparse_matrix.py with:
+#   CFLAGS="-O3 -march=native" cythonize -i _sparsematrix_c.pyx
+
+from cpython cimport array
+from libc.stdlib cimport qsort
+import array
+
+ctypedef fused value_t:
+    long long
+    double
+
+
+cdef int _compare_indices(const void *a, const void *b) noexcept nogil:
+    cdef long long x = (<const long long *>a)[0]
+    cdef long long y = (<const long long *>b)[0]
+    return (x > y) - (x < y)
+
+
+def spgemm_csr(const long long[::1] indptr_a, const long long[::1] ind_a, const value_t[::1] data_a,
+               const long long[::1] indptr_b, const long long[::1] ind_b, const value_t[::1] data_b,
+               Py_ssize_t m, Py_ssize_t n):
+    '''Returns 3-tuple of CSR lists (indptr, indices, data) of the product of two CSR operands: a (m rows) and b (n columns).
+    Index buffers hold int64 ('q'); data_a and data_b both hold int64 ('q') or both hold float64 ('d').
+    Column indices in each output row are sorted; values that cancel to 0 are kept.'''
+    cdef Py_ssize_t r, jj, kk, k, c, p, q
+    cdef value_t value
+
+    # first pass counts the stored values of each output row so the output arrays are allocated once
+    cdef array.array marker_arr = array.clone(array.array('q'), n, zero=False)
+    cdef long long[::1] marker = marker_arr
+    cdef array.array indptr_arr = array.clone(array.array('q'), m + 1, zero=True)
+    cdef long long[::1] indptr_c = indptr_arr
+    marker[:] = -1
+    for r in range(m):
+        p = 0
+        for jj in range(indptr_a[r], indptr_a[r+1]):
+            k = ind_a[jj]
+            for kk in range(indptr_b[k], indptr_b[k+1]):
+                c = ind_b[kk]
+                if marker[c] != r:
+                    marker[c] = r
+                    p += 1
+        indptr_c[r+1] = indptr_c[r] + p
+
+    cdef array.array value_template
+    if value_t is double:
+        value_template = array.array('d')
+    else:
+        value_template = array.array('q')
+    cdef array.array ind_arr = array.clone(array.array('q'), indptr_c[m], zero=False)
+    cdef long long[::1] ind_c = ind_arr
+    cdef array.array data_arr = array.clone(value_template, indptr_c[m], zero=False)
+    cdef value_t[::1] data_c = data_arr
+    cdef array.array workspace_arr = array.clone(value_template, n, zero=True)
+    cdef value_t[::1] workspace = workspace_arr
+
+    marker[:] = -1
+    for r in range(m):
+        p = indptr_c[r]
+        for jj in range(indptr_a[r], indptr_a[r+1]):
+            k = ind_a[jj]
+            value = data_a[jj]
+            for kk in range(indptr_b[k], indptr_b[k+1]):
+                c = ind_b[kk]
+                if marker[c] != r:
+                    marker[c] = r
+                    workspace[c] = value * data_b[kk]
+                    ind_c[p] = c
+                    p += 1
+                else:
+                    workspace[c] += value * data_b[kk]
+
+        if p > indptr_c[r]:
+            qsort(&ind_c[indptr_c[r]], p - indptr_c[r], sizeof(long long), _compare_indices)
+        for q in range(indptr_c[r], p):
+            data_c[q] = workspace[ind_c[q]]
+
+    return indptr_arr.tolist(), ind_arr.tolist(), data_arr.tolist()
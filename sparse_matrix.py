@@ -3,12 +3,204 @@
 
 import prompt
 from goody import type_as_str
+from operator import attrgetter, itemgetter, neg, pos, sub
+from array import array
+from itertools import chain, repeat
+
+# numpy, numba, and the _sparsematrix_c extension (built from _sparsematrix_c.pyx) are optional:
+# without numpy, only int and float values are accepted;
+# large Sparse_Matrix products run in the C kernel if it is built, else in the numba kernel, else in the pure-Python kernel
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    from _sparsematrix_c import spgemm_csr as _spgemm_csr_c
+except ImportError:
+    _spgemm_csr_c = None
+
+
+_NUMBER_TYPES = (int, float) if np is None else (int, float, np.integer, np.floating)
+
+
+def _is_number(x) -> bool:
+    '''Returns whether x is a value Sparse_Matrix can store: an int or float, including NumPy integer and floating scalars (but not a bool).'''
+    return isinstance(x, _NUMBER_TYPES) and (type(x) is not bool)
+
+
+def _spgemm_csr(indptr_a, ind_a, data_a, indptr_b, ind_b, data_b, m, n):
+    '''Returns 3-tuple of CSR lists (indptr, indices, data) of the product of two CSR operands: a (m rows) and b (n columns).
+    Uses Gustavson's algorithm: each stored value of row r in a scales row k of b into a dense accumulator for row r.
+    Column indices in each output row are sorted; values that cancel to 0 are kept.'''
+    indptr_c = [0]
+    ind_c = []
+    data_c = []
+    workspace = [0]*n
+    marker = [-1]*n
+    for r in range(m):
+        touched = []
+        touch = touched.append
+        for jj in range(indptr_a[r], indptr_a[r+1]):
+            k = ind_a[jj]
+            value = data_a[jj]
+            for kk in range(indptr_b[k], indptr_b[k+1]):
+                c = ind_b[kk]
+                if marker[c] != r:
+                    marker[c] = r
+                    workspace[c] = value * data_b[kk]
+                    touch(c)
+                else:
+                    workspace[c] += value * data_b[kk]
+        
+        touched.sort()
+        ind_c.extend(touched)
+        data_c.extend([workspace[c] for c in touched])
+        indptr_c.append(len(ind_c))
+    
+    return indptr_c, ind_c, data_c
+
+
+def _spgemm_csr_arrays(indptr_a, ind_a, data_a, indptr_b, ind_b, data_b, m, n):
+    '''Version of _spgemm_csr over NumPy arrays, compiled by numba in _jit_kernel; data_a and data_b must share one dtype.'''
+    # first pass counts the stored values of each output row so the output arrays are allocated once
+    marker = np.full(n, -1, np.int64)
+    indptr_c = np.zeros(m+1, np.int64)
+    for r in range(m):
+        count = 0
+        for jj in range(indptr_a[r], indptr_a[r+1]):
+            k = ind_a[jj]
+            for kk in range(indptr_b[k], indptr_b[k+1]):
+                c = ind_b[kk]
+                if marker[c] != r:
+                    marker[c] = r
+                    count += 1
+        indptr_c[r+1] = indptr_c[r] + count
+    
+    ind_c = np.empty(indptr_c[m], np.int64)
+    data_c = np.empty(indptr_c[m], data_a.dtype)
+    workspace = np.zeros(n, data_a.dtype)
+    marker[:] = -1
+    for r in range(m):
+        p = indptr_c[r]
+        for jj in range(indptr_a[r], indptr_a[r+1]):
+            k = ind_a[jj]
+            value = data_a[jj]
+            for kk in range(indptr_b[k], indptr_b[k+1]):
+                c = ind_b[kk]
+                if marker[c] != r:
+                    marker[c] = r
+                    workspace[c] = value * data_b[kk]
+                    ind_c[p] = c
+                    p += 1
+                else:
+                    workspace[c] += value * data_b[kk]
+        
+        ind_c[indptr_c[r]:p].sort()
+        for q in range(indptr_c[r], p):
+            data_c[q] = workspace[ind_c[q]]
+    
+    return indptr_c, ind_c, data_c
+
+
+# numba is imported and the kernel compiled (or loaded from numba's cache) only when a product first needs it
+_spgemm_csr_jit = None
+_numba_missing = False
+
+
+def _jit_kernel():
+    '''Returns numba-compiled _spgemm_csr_arrays, importing numba on the first call; returns None if numba is not installed.'''
+    global _spgemm_csr_jit, _numba_missing
+    if (_spgemm_csr_jit is None) and not _numba_missing:
+        try:
+            from numba import njit
+        except ImportError:
+            _numba_missing = True
+        else:
+            _spgemm_csr_jit = njit(cache=True)(_spgemm_csr_arrays)
+    return _spgemm_csr_jit
+
+
+def _drop_zeros(matrix_dict) -> dict:
+    '''Returns matrix_dict without its 0 values; a filtered copy is only built if a 0 value is present.'''
+    if 0 in matrix_dict.values():
+        return {k: v for k, v in matrix_dict.items() if v != 0}
+    return matrix_dict
+
+
+def _fits_int64(data_a, data_b, inner) -> bool:
+    '''Returns whether no sum of inner products of int values from data_a and data_b can overflow int64.'''
+    max_a = max((abs(int(v)) for v in data_a), default=0)
+    max_b = max((abs(int(v)) for v in data_b), default=0)
+    return max_a * max_b * inner < 2**63
+
+
+def _machine_typecode(data_a, data_b, inner):
+    '''Returns array typecode ('d' for float64, 'q' for int64) that the compiled kernels can multiply data_a and data_b in without changing the result, or None.
+    Python floats and numpy.float64 use float64; Python ints and numpy.int64 use int64 only if no sum of inner products can overflow it.
+    Other NumPy scalar types (e.g., numpy.float32 or numpy.int8 from Sparse_Matrix.astype) return None, so their products use NumPy's own arithmetic in the pure-Python kernel.'''
+    value_types = set(map(type, data_a)) | set(map(type, data_b))
+    if value_types <= {float}:
+        return 'd'
+    if value_types == {int}:
+        if _fits_int64(data_a, data_b, inner):
+            return 'q'
+    elif (len(value_types) == 1) and (np is not None):
+        value_type = value_types.pop()
+        if value_type is np.float64:
+            return 'd'
+        if (value_type is np.int64) and _fits_int64(data_a, data_b, inner):
+            return 'q'
+    return None
+
+
+# products with fewer multiply-adds than this run in the pure-Python kernel: below it, packing the operands into
+# machine arrays (and, for numba, importing and loading the compiled kernel) costs more than the kernel saves
+_COMPILED_MIN_FLOPS = 1_000_000
+
+
+def _spgemm(csr_a, csr_b, m, n, inner):
+    '''Returns 3-tuple of CSR lists of the product of CSR operands csr_a (m x inner) and csr_b (inner x n).
+    If the product needs at least _COMPILED_MIN_FLOPS multiply-adds and the values fit a machine type,
+    runs the C kernel when _sparsematrix_c is built, or else the numba kernel when numba is installed; otherwise runs the pure-Python kernel.'''
+    if (_spgemm_csr_c is None) and _numba_missing:
+        return _spgemm_csr(*csr_a, *csr_b, m, n)
+    
+    # each stored value in column k of a is multiplied by every stored value in row k of b
+    indptr_b = csr_b[0]
+    row_lengths_b = list(map(sub, indptr_b[1:], indptr_b[:-1]))
+    if sum(map(row_lengths_b.__getitem__, csr_a[1])) < _COMPILED_MIN_FLOPS:
+        return _spgemm_csr(*csr_a, *csr_b, m, n)
+    
+    typecode = _machine_typecode(csr_a[2], csr_b[2], inner)
+    if (typecode is None) or ((_spgemm_csr_c is None) and (_jit_kernel() is None)):
+        return _spgemm_csr(*csr_a, *csr_b, m, n)
+    
+    if _spgemm_csr_c is not None:
+        indptr_c, ind_c, data_c = _spgemm_csr_c(array('q', csr_a[0]), array('q', csr_a[1]), array(typecode, csr_a[2]),
+                                                array('q', csr_b[0]), array('q', csr_b[1]), array(typecode, csr_b[2]), m, n)
+    else:
+        indptr_c, ind_c, data_c = _spgemm_csr_jit(np.array(csr_a[0], np.int64), np.array(csr_a[1], np.int64), np.array(csr_a[2], typecode),
+                                                  np.array(csr_b[0], np.int64), np.array(csr_b[1], np.int64), np.array(csr_b[2], typecode), m, n)
+        indptr_c, ind_c, data_c = indptr_c.tolist(), ind_c.tolist(), data_c.tolist()
+    
+    value_type = type((csr_a[2] or csr_b[2] or [0.0])[0])
+    if value_type not in (int, float):
+        # numpy.float64 and numpy.int64 values were multiplied as plain 64-bit values; give the products their type back
+        data_c = list(map(value_type, data_c))
+    
+    return indptr_c, ind_c, data_c
 
 
 class Sparse_Matrix:
     '''Constructs Sparse_Matrix object and defines operators for it.
     Sparse_Matrix is represented by a dictionary.
     Any row, column index that is not a key in the dictionary implicitly stores 0.'''
+    # Sparse_Matrix cannot store attributes other than these; rows, cols, and matrix are read-only properties over _rows, _cols, and _matrix
+    __slots__ = ('_rows', '_cols', '_matrix', '_csr_cache', '_csc_cache')
+    # NumPy scalars on the left of +, -, * defer to __radd__, __rsub__, __rmul__ instead of treating Sparse_Matrix as an array
+    __array_ufunc__ = None
+    
     def __init__(self, rows: int, cols: int, *matrix: (int, int, int)): 
         '''Parameters:
         rows (int): number of rows for Sparse_Matrix
@@ -18,47 +210,92 @@ class Sparse_Matrix:
         Attributes:
         rows (int): row size of Sparse_Matrix
         cols (int): column size of Sparse_Matrix
-        matrix (dict): key (2-tuple of ints) is row, column index; value (non-zero int or float) is value stored at index''' 
+        matrix (dict): key (2-tuple of ints) is row, column index; value (non-zero int or float) is value stored at index
+        _csr_cache, _csc_cache: CSR and CSC views of matrix built on first use; None until built or after matrix is mutated
+        rows, cols, and matrix cannot be re-bound; use __call__ to resize Sparse_Matrix''' 
         assert (type(rows) is int) and (rows > 0), 'Sparse_Matrix.__init__: invalid row argument (' + str(rows) + ') of ' + type_as_str(rows) + ' type; must be int greater than 0'
         assert (type(cols) is int) and (cols > 0), 'Sparse_Matrix.__init__: invalid column argument (' + str(cols) + ') of ' + type_as_str(cols) + ' type; must be int greater than 0'
         
         matrix_dict = {}
         for tup in matrix:
-            assert (type(tup[0]) is int) and (type(tup[1]) is int), 'Sparse_Matrix.__init__: invalid row, column index type(s) of ' + type_as_str(rows) + ' and ' + type_as_str(cols) + '; must be non-negative int'
-            assert (-1 < tup[0] < rows) and (-1 < tup[1] < cols), 'Sparse_Matrix.__init__: invalid row, column index (' + str(tup[0]) + ',' + str(tup[1]) + '); must be within Sparse_Matrix size (' + str(rows) + ',' + str(cols) + ')'
-            assert (tup[0], tup[1]) not in matrix_dict, 'Sparse_Matrix.__init__: row and column index (' + str(tup[0]) + ',' + str(tup[1]) + ') duplicated'
-            assert type(tup[2]) is (int or float), 'Sparse_Matrix.__init__: invalid matrix value type of ' + type_as_str(tup[2]) + '; must be int or float'
+            # unpack each triple once; the assert messages are only built when a check fails
+            r, c, value = tup[0], tup[1], tup[2]
+            index = (r, c)
+            assert (type(r) is int) and (type(c) is int), 'Sparse_Matrix.__init__: invalid row, column index type(s) of ' + type_as_str(r) + ' and ' + type_as_str(c) + '; must be non-negative int'
+            assert (-1 < r < rows) and (-1 < c < cols), 'Sparse_Matrix.__init__: invalid row, column index (' + str(r) + ',' + str(c) + '); must be within Sparse_Matrix size (' + str(rows) + ',' + str(cols) + ')'
+            assert index not in matrix_dict, 'Sparse_Matrix.__init__: row and column index (' + str(r) + ',' + str(c) + ') duplicated'
+            assert _is_number(value), 'Sparse_Matrix.__init__: invalid matrix value type of ' + type_as_str(value) + '; must be int or float'
             
-            if tup[2] != 0:
-                matrix_dict[(tup[0],tup[1])] = tup[2]
+            if value != 0:
+                matrix_dict[index] = value
         
-        self.rows = rows
-        self.cols = cols
-        self.matrix = matrix_dict
+        self._rows = rows
+        self._cols = cols
+        self._matrix = matrix_dict
+        self._csr_cache = None
+        self._csc_cache = None
+    
+    
+    @classmethod
+    def _unchecked(cls, rows, cols, matrix_dict):
+        '''Returns new Sparse_Matrix storing matrix_dict without running the checks in __init__.
+        Only for results of operations on existing Sparse_Matrix objects: matrix_dict must hold valid indices and no 0 values.'''
+        new = cls.__new__(cls)
+        new._rows = rows
+        new._cols = cols
+        new._matrix = matrix_dict
+        new._csr_cache = None
+        new._csc_cache = None
+        return new
+    
+    
+    def _cannot_rebind(self, value):
+        '''Setter for rows, cols, and matrix: re-binding them would leave the cached CSR and CSC views stale, so raises AssertionError.'''
+        assert False, 'Sparse_Matrix.__setattr__: Sparse_Matrix object cannot store new attributes or re-bind existing attributes'
+    
+    
+    rows = property(attrgetter('_rows'), _cannot_rebind, doc = 'row size of Sparse_Matrix')
+    cols = property(attrgetter('_cols'), _cannot_rebind, doc = 'column size of Sparse_Matrix')
+    matrix = property(attrgetter('_matrix'), _cannot_rebind, doc = 'dict storing the non-zero values of Sparse_Matrix')
              
            
     def __str__(self):
-        size = str(self.rows)+'x'+str(self.cols)
-        width = max(len(str(self.matrix.get((r,c),0))) for c in range(self.cols) for r in range(self.rows))
-        return size+':['+('\n'+(2+len(size))*' ').join ('  '.join('{num: >{width}}'.format(num=self.matrix.get((r,c),0),width=width) for c in range(self.cols))\
-                                                                                             for r in range(self.rows))+']'
+        size = str(self._rows)+'x'+str(self._cols)
+        indptr, indices, data = self._to_csr()
+        
+        # stringify each stored value once; only these, and 0 if any index is not stored, can set the column width
+        value_strs = [str(v) for v in data]
+        widths = [len(v) for v in value_strs]
+        if len(data) < self._rows*self._cols:
+            widths.append(len('0'))
+        width = max(widths)
+        
+        zero_str = '0'.rjust(width)
+        lines = []
+        for r in range(self._rows):
+            row_strs = [zero_str]*self._cols
+            for jj in range(indptr[r], indptr[r+1]):
+                row_strs[indices[jj]] = value_strs[jj].rjust(width)
+            lines.append('  '.join(row_strs))
+        
+        return size+':['+('\n'+(2+len(size))*' ').join(lines)+']'
                                                                                         
     
     def size(self) -> (int, int):
         '''Returns 2-tuple where index 0 is row size (int); index 1 is column size (int)'''
-        return (self.rows, self.cols)
+        return (self._rows, self._cols)
     
     
     def __len__(self) -> int:
         '''Returns number of 0 and non-zero values in Sparse_Matrix'''
-        return self.rows*self.cols
+        return self._rows*self._cols
     
     
     def __bool__(self) -> bool:
         '''Return:
         False: Sparse_Matrix stores all 0 values
         True: Sparse_Matrix stores any non-zero values'''
-        if len(self.matrix) != 0:
+        if len(self._matrix) != 0:
             return True
         else:
             return False
@@ -69,12 +306,12 @@ class Sparse_Matrix:
         String format example: Sparse_Matrix(3, 3, (0, 0, 1), (1, 1, 1), (2, 2, 1))'''
         triples_list = []
         
-        for k, v in self.matrix.items():
+        for k, v in self._matrix.items():
             triples_list.append(str((k[0],k[1],v)))
         
         triples_str = ','.join(triples_list)
         
-        return 'Sparse_Matrix(' + str(self.rows) + ', ' + str(self.cols) + ', ' + triples_str + ')'
+        return 'Sparse_Matrix(' + str(self._rows) + ', ' + str(self._cols) + ', ' + triples_str + ')'
         
     
     def __getitem__(self, row_col):
@@ -85,15 +322,12 @@ class Sparse_Matrix:
         row_col (2-tuple of ints): index 0 is row index (int); index 1 is column index(int)'''
         if (type(row_col) is not tuple) or (len(row_col) != 2) or (type(row_col[0]) is not int) or (type(row_col[1]) is not int):
             raise TypeError('Sparse_Matrix.__getitem__: invalid argument (' + str(row_col) + ') of ' + type_as_str(row_col) + ' type; must be 2-tuple of ints')
-        if (row_col[0] < 0) or (row_col[0] > self.rows - 1):
-            raise TypeError('Sparse_Matrix.__getitem__: invalid row index (' + str(row_col[0]) + '); must be within Sparse_Matrix size (' + str(self.rows) + ',' + str(self.cols) + ')')
-        if (row_col[1] < 0) or (row_col[1] > self.cols - 1):
-            raise TypeError('Sparse_Matrix.__getitem__: invalid column index (' + str(row_col[1]) + '); must be within Sparse_Matrix size (' + str(self.rows) + ',' + str(self.cols) + ')')
+        if (row_col[0] < 0) or (row_col[0] > self._rows - 1):
+            raise TypeError('Sparse_Matrix.__getitem__: invalid row index (' + str(row_col[0]) + '); must be within Sparse_Matrix size (' + str(self._rows) + ',' + str(self._cols) + ')')
+        if (row_col[1] < 0) or (row_col[1] > self._cols - 1):
+            raise TypeError('Sparse_Matrix.__getitem__: invalid column index (' + str(row_col[1]) + '); must be within Sparse_Matrix size (' + str(self._rows) + ',' + str(self._cols) + ')')
         else:
-            if row_col not in self.matrix:
-                return 0
-            else:
-                return self.matrix[row_col]
+            return self._matrix.get(row_col, 0)
     
     
     def __setitem__(self, row_col, value):
@@ -107,20 +341,25 @@ class Sparse_Matrix:
         if (type(row_col) is not tuple) or (len(row_col) != 2) or (type(row_col[0]) is not int) or (type(row_col[1]) is not int):
             raise TypeError('Sparse_Matrix.__setitem__: invalid argument (' + str(row_col) + ') of ' + type_as_str(row_col) + ' type; must be 2-tuple of ints')
         
-        if (row_col[0] < 0) or (row_col[0] > self.rows - 1):
-            raise TypeError('Sparse_Matrix.__setitem__: invalid row index (' + str(row_col[0]) + '); must be within Sparse_Matrix size (' + str(self.rows) + ',' + str(self.cols) + ')')
+        if (row_col[0] < 0) or (row_col[0] > self._rows - 1):
+            raise TypeError('Sparse_Matrix.__setitem__: invalid row index (' + str(row_col[0]) + '); must be within Sparse_Matrix size (' + str(self._rows) + ',' + str(self._cols) + ')')
         
-        if (row_col[1] < 0) or (row_col[1] > self.cols - 1):
-            raise TypeError('Sparse_Matrix.__setitem__: invalid column index (' + str(row_col[1]) + '); must be within Sparse_Matrix size (' + str(self.rows) + ',' + str(self.cols) + ')')
+        if (row_col[1] < 0) or (row_col[1] > self._cols - 1):
+            raise TypeError('Sparse_Matrix.__setitem__: invalid column index (' + str(row_col[1]) + '); must be within Sparse_Matrix size (' + str(self._rows) + ',' + str(self._cols) + ')')
         
-        if type(value) is not (int or float):
+        if not _is_number(value):
             raise TypeError('Sparse_Matrix.__setitem__: invalid value type of ' + type_as_str(value) + '; must be int or float')
         
         else:
-            if (value == 0) and (row_col in self.matrix):
-                self.matrix.pop(row_col)
-            elif value != 0:
-                self.matrix[row_col] = value
+            # pop with a default hashes row_col once, whether or not it is stored;
+            # stored values are never None, so None means nothing changed and the cached views are still valid
+            matrix = self._matrix
+            if value == 0:
+                if matrix.pop(row_col, None) is not None:
+                    self._clear_cache()
+            else:
+                matrix[row_col] = value
+                self._clear_cache()
     
     
     def __delitem__(self, row_col):
@@ -133,14 +372,15 @@ class Sparse_Matrix:
         if (type(row_col) is not tuple) or (len(row_col) != 2) or (type(row_col[0]) is not int) or (type(row_col[1]) is not int):
             raise TypeError('Sparse_Matrix.__delitem__: invalid argument (' + str(row_col) + ') of ' + type_as_str(row_col) + ' type; must be 2-tuple of ints')
         
-        if (row_col[0] < 0) or (row_col[0] > self.rows - 1):
-            raise TypeError('Sparse_Matrix.__delitem__: invalid row index (' + str(row_col[0]) + '); must be within Sparse_Matrix size (' + str(self.rows) + ',' + str(self.cols) + ')')
+        if (row_col[0] < 0) or (row_col[0] > self._rows - 1):
+            raise TypeError('Sparse_Matrix.__delitem__: invalid row index (' + str(row_col[0]) + '); must be within Sparse_Matrix size (' + str(self._rows) + ',' + str(self._cols) + ')')
         
-        if (row_col[1] < 0) or (row_col[1] > self.cols - 1):
-            raise TypeError('Sparse_Matrix.__delitem__: invalid column index (' + str(row_col[1]) + '); must be within Sparse_Matrix size (' + str(self.rows) + ',' + str(self.cols) + ')')
+        if (row_col[1] < 0) or (row_col[1] > self._cols - 1):
+            raise TypeError('Sparse_Matrix.__delitem__: invalid column index (' + str(row_col[1]) + '); must be within Sparse_Matrix size (' + str(self._rows) + ',' + str(self._cols) + ')')
         
-        if row_col in self.matrix:
-            self.matrix.pop(row_col)
+        # stored values are never None, so None means row_col was not stored and the cached views are still valid
+        if self._matrix.pop(row_col, None) is not None:
+            self._clear_cache()
     
     
     def row(self, r) -> tuple:
@@ -149,14 +389,17 @@ class Sparse_Matrix:
         
         Parameter:
         r (int): row that values will be returned from'''
-        assert (type(r) is int) and (-1 < r < self.rows), 'Sparse_Matrix.row: invalid argument (' + str(r) + ') of ' + type_as_str(r) + ' type; must be int within Sparse_Matrix size (' + str(self.rows) + ',' + str(self.cols) + ')'
+        assert (type(r) is int) and (-1 < r < self._rows), 'Sparse_Matrix.row: invalid argument (' + str(r) + ') of ' + type_as_str(r) + ' type; must be int within Sparse_Matrix size (' + str(self._rows) + ',' + str(self._cols) + ')'
         
-        row_values = []
-        for i in range(self.cols):
-            if (r,i) not in self.matrix:
-                row_values.append(0) 
-            else:
-                row_values.append(self.matrix[(r,i)])
+        # slice the CSR view only if it is already built; building it just to read one row costs more than probing the dict
+        if self._csr_cache is None:
+            get = self._matrix.get
+            return tuple([get((r,i), 0) for i in range(self._cols)])
+        
+        indptr, indices, data = self._csr_cache
+        row_values = [0]*self._cols
+        for jj in range(indptr[r], indptr[r+1]):
+            row_values[indices[jj]] = data[jj]
 
         return tuple(row_values)
     
@@ -167,28 +410,131 @@ class Sparse_Matrix:
         
         Parameter:
         c (int): column that values will be returned from'''
-        assert (type(c) is int) and (-1 < c < self.cols), 'Sparse_Matrix.col: invalid argument (' + str(c) + ') of ' + type_as_str(c) + ' type; must be int within Sparse_Matrix size (' + str(self.rows) + ',' + str(self.cols) + ')'
+        assert (type(c) is int) and (-1 < c < self._cols), 'Sparse_Matrix.col: invalid argument (' + str(c) + ') of ' + type_as_str(c) + ' type; must be int within Sparse_Matrix size (' + str(self._rows) + ',' + str(self._cols) + ')'
         
-        col_values = []
-        for i in range(self.rows):
-            if (i,c) not in self.matrix:
-                col_values.append(0)
-            else:
-                col_values.append(self.matrix[(i,c)])
+        # slice the CSC view only if it is already built; building it just to read one column costs more than probing the dict
+        if self._csc_cache is None:
+            get = self._matrix.get
+            return tuple([get((i,c), 0) for i in range(self._rows)])
+        
+        indptr, indices, data = self._csc_cache
+        col_values = [0]*self._rows
+        for ii in range(indptr[c], indptr[c+1]):
+            col_values[indices[ii]] = data[ii]
                 
         return tuple(col_values)
     
     
+    def _compress(self, by_column) -> (list, list, list):
+        '''Returns 3-tuple (indptr, indices, data) of compressed lists of Sparse_Matrix: by row (CSR) if by_column is False; by column (CSC) if True.
+        Each row, column index is packed into one int, with the major index shifted left past the bits of the minor index,
+        so sorting compares ints rather than index tuples.'''
+        matrix = self._matrix
+        major_size, minor_size = (self._cols, self._rows) if by_column else (self._rows, self._cols)
+        shift = minor_size.bit_length()
+        if by_column:
+            keys = [(c << shift) | r for r, c in matrix]
+        else:
+            keys = [(r << shift) | c for r, c in matrix]
+        
+        order = sorted(range(len(keys)), key = keys.__getitem__)
+        sorted_keys = [keys[i] for i in order]
+        values = list(matrix.values())
+        
+        indptr = [0]*(major_size+1)
+        for k in sorted_keys:
+            indptr[(k >> shift)+1] += 1
+        for i in range(major_size):
+            indptr[i+1] += indptr[i]
+        
+        mask = (1 << shift) - 1
+        return indptr, [k & mask for k in sorted_keys], [values[i] for i in order]
+    
+    
+    def _to_csr(self) -> (list, list, list):
+        '''Returns 3-tuple of compressed sparse row (CSR) lists of Sparse_Matrix.
+        index 0 is indptr: values of row r are stored from index indptr[r] up to (not including) indptr[r+1]; index 1 is column index of each stored value; index 2 is stored values
+        The lists are cached until Sparse_Matrix is mutated, so callers must not modify them.'''
+        if self._csr_cache is None:
+            self._csr_cache = self._compress(False)
+        
+        return self._csr_cache
+    
+    
+    def _to_csc(self) -> (list, list, list):
+        '''Returns 3-tuple of compressed sparse column (CSC) lists of Sparse_Matrix.
+        index 0 is indptr: values of column c are stored from index indptr[c] up to (not including) indptr[c+1]; index 1 is row index of each stored value; index 2 is stored values
+        The lists are cached until Sparse_Matrix is mutated, so callers must not modify them.'''
+        if self._csc_cache is None:
+            self._csc_cache = self._compress(True)
+        
+        return self._csc_cache
+    
+    
+    def _map_values(self, op):
+        '''Returns new Sparse_Matrix storing op(v) at the index of every value v stored in self; op must never map a non-zero value to 0.
+        Indices and values are handled as separate sequences: the index lists of any cached CSR/CSC view are shared with the new Sparse_Matrix, so only the values are recomputed.'''
+        matrix = self._matrix
+        new = Sparse_Matrix._unchecked(self._rows, self._cols, dict(zip(matrix.keys(), map(op, matrix.values()))))
+        
+        if self._csr_cache is not None:
+            indptr, indices, data = self._csr_cache
+            new._csr_cache = (indptr, indices, list(map(op, data)))
+        if self._csc_cache is not None:
+            indptr, indices, data = self._csc_cache
+            new._csc_cache = (indptr, indices, list(map(op, data)))
+        
+        return new
+    
+    
+    def _clear_cache(self):
+        '''Discards cached CSR and CSC views of Sparse_Matrix; must be called whenever matrix, rows, or cols changes.'''
+        self._csr_cache = None
+        self._csc_cache = None
+    
+    
     def details(self) -> str:
         '''Returns string indicating Sparse_Matrix size -> dictionary -> tuple of all rows.
         String format example: 3x3 -> {(0, 0): 1, (1, 1): 5, (2, 2): 1} -> ((1, 0, 0), (0, 5, 0), (0, 0, 1))'''
+        # write each row as str(tuple) would, straight from the CSR view, instead of building a tuple per row first;
+        # 1-element tuples need a trailing comma
+        indptr, indices, data = self._to_csr()
+        trailer = ',)' if self._cols == 1 else ')'
+        zero_row = '(' + ', '.join(['0']*self._cols) + trailer
         all_rows = []
-        for i in range(self.rows):
-            all_rows.append(self.row(i))
+        for r in range(self._rows):
+            if indptr[r] == indptr[r+1]:
+                all_rows.append(zero_row)
+            else:
+                row_strs = ['0']*self._cols
+                for jj in range(indptr[r], indptr[r+1]):
+                    row_strs[indices[jj]] = repr(data[jj])
+                all_rows.append('(' + ', '.join(row_strs) + trailer)
             
-        matrix_size = str(self.rows) + 'x' + str(self.cols)
+        matrix_size = str(self._rows) + 'x' + str(self._cols)
         
-        return matrix_size + ' -> ' + str(self.matrix) + ' -> ' + str(tuple(all_rows))
+        return matrix_size + ' -> ' + str(self._matrix) + ' -> (' + ', '.join(all_rows) + (',)' if self._rows == 1 else ')')
+    
+    
+    def astype(self, value_type):
+        '''Returns new Sparse_Matrix with every stored value converted by value_type; values converted to 0 are not stored.
+        value_type may be int, float, or a NumPy integer or floating scalar type (e.g., numpy.float32 or numpy.int16).
+        This only converts values: each value is still stored as its own object in matrix, so NumPy types do not reduce memory.
+        Products of NumPy types other than numpy.int64 and numpy.float64 run in the pure-Python kernel with NumPy's arithmetic,
+        so they round in value_type and integer types wrap on overflow (with a NumPy warning).
+        If value_type does not convert values to int or float (or a NumPy integer or floating scalar), raises TypeError.
+        
+        Parameter:
+        value_type (type): type that each stored value is converted to'''
+        matrix_dict = {}
+        for k, v in self._matrix.items():
+            value = value_type(v)
+            if not _is_number(value):
+                raise TypeError('Sparse_Matrix.astype: invalid value type of ' + type_as_str(value) + ' from ' + str(value_type) + '; must be int or float')
+            if value != 0:
+                matrix_dict[k] = value
+        
+        return Sparse_Matrix._unchecked(self._rows, self._cols, matrix_dict)
     
     
     def __call__(self, new_rows, new_cols):
@@ -202,53 +548,39 @@ class Sparse_Matrix:
         assert (type(new_rows) is int) and new_rows > 0, 'Sparse_Matrix.__call__: invalid row (' + str(new_rows) + ') of ' + type_as_str(new_rows) + ' type; must be int greater than 0'
         assert (type(new_cols) is int) and new_cols > 0, 'Sparse_Matrix.__call__: invalid column (' + str(new_cols) + ') of ' + type_as_str(new_cols) + ' type; must be int greater than 0'
         
-        # create copy of sparse matrix dictionary to update
-        matrix_copy = {}
-        for k, v in self.matrix.items():
-            matrix_copy[k] = v
-            
-        for k1 in matrix_copy.keys():
-            if k1[0] >= new_rows:
-                for c in range(self.cols):
-                    self.__delitem__((k1[0],c))
-            if k1[1] >= new_cols:
-                for r in range(self.rows):
-                    self.__delitem__((r,k[1]))
-        
-        del self.rows
-        del self.cols
-        
-        self.rows = new_rows
-        self.cols = new_cols
+        # keep only the values whose index lies inside the new size
+        self._matrix = {k: v for k, v in self._matrix.items() if (k[0] < new_rows) and (k[1] < new_cols)}
+        self._rows = new_rows
+        self._cols = new_cols
+        self._clear_cache()
     
     
     def __iter__(self) -> tuple:
         '''Yields 3-tuple where index 0 is row index (int); index 1 is column index (int); index 2 is value (int or float) stored at index.
         Tuples yielded are sorted in increasing order of index 2 (value).'''
-        for k, v in sorted(self.matrix.items(), key = lambda x: (x[1])):
-            yield (k[0], k[1], v)
+        # items are (index, value) pairs; itemgetter(1) extracts the value in C rather than through a lambda call
+        for (r, c), v in sorted(self._matrix.items(), key = itemgetter(1)):
+            yield (r, c, v)
     
     
     def __pos__(self):
         '''Returns new Sparse_Matrix with same values.'''
-        matrix = [(k[0], k[1], v) for k, v in self.matrix.items()]
-        return Sparse_Matrix(self.rows, self.cols, *matrix)
+        return self._map_values(pos)
     
     
     def __neg__(self):
         '''Returns new Sparse_Matrix with negated values.'''
-        matrix = [(k[0], k[1], -v) for k, v in self.matrix.items()]
-        return Sparse_Matrix(self.rows, self.cols, *matrix)
+        return self._map_values(neg)
     
     
     def __abs__(self):
         '''Returns new Sparse_Matrix with all non-negative values.'''
-        matrix = [(k[0], k[1], abs(v)) for k, v in self.matrix.items()]
-        return Sparse_Matrix(self.rows, self.cols, *matrix)
+        return self._map_values(abs)
     
     
     def __add__(self, right):
         '''Returns new Sparse_Matrix by adding right argument to self.
+        If right argument is int or float, it is added to the non-zero values only; implicit 0 values stay 0.
         If type of right argument is not int, float, or Sparse_Matrix, raises TypeError.
         If right argument is Sparse_Matrix, but not the same size, raises AssertionError.
         
@@ -256,13 +588,19 @@ class Sparse_Matrix:
         right (int, float, or Sparse_Matrix): operand to be added to left operand'''
         if type(right) is Sparse_Matrix:
             assert self.size() == right.size(), 'Sparse_Matrix.__add__: Sparse_Matrix size(s) incompatible for +: ' + str(self.size()) + ' and ' + str(right.size())
-            matrix = [(k[0], k[1], v + right[(k[0], k[1])]) for k, v in self.matrix.items()]
-        elif type(right) is (int or float):
-            matrix = [(k[0], k[1], v + right) for k, v in self.matrix.items()]
+            # merge over the union of stored indices: left values (plus any right value), then indices stored only in right
+            left_matrix, right_matrix = self._matrix, right._matrix
+            right_get = right_matrix.get
+            matrix_dict = _drop_zeros({k: v + right_get(k, 0) for k, v in left_matrix.items()})
+            for k, v in right_matrix.items():
+                if k not in left_matrix:
+                    matrix_dict[k] = v
+        elif _is_number(right):
+            matrix_dict = _drop_zeros({k: v + right for k, v in self._matrix.items()})
         else:
             raise TypeError('Sparse_Matrix.__add__: unsupported operand type(s) for +: ' + type_as_str(right) + ' and Sparse_Matrix')
         
-        return Sparse_Matrix(self.rows, self.cols, *matrix)
+        return Sparse_Matrix._unchecked(self._rows, self._cols, matrix_dict)
     
     
     def __radd__(self, left):
@@ -278,9 +616,16 @@ class Sparse_Matrix:
         right (int, float, or Sparse_Matrix): operand to be subtracted from left operand'''
         if type(right) is Sparse_Matrix:
             assert self.size() == right.size(), 'Sparse_Matrix.__sub__: Sparse_Matrix size(s) incompatible for -: ' + str(self.size()) + ' and ' + str(right.size())
-            return self.__add__(right.__neg__())
+            # same merge as __add__, negating right values in place instead of building a negated copy of right first
+            left_matrix, right_matrix = self._matrix, right._matrix
+            right_get = right_matrix.get
+            matrix_dict = _drop_zeros({k: v - right_get(k, 0) for k, v in left_matrix.items()})
+            for k, v in right_matrix.items():
+                if k not in left_matrix:
+                    matrix_dict[k] = -v
+            return Sparse_Matrix._unchecked(self._rows, self._cols, matrix_dict)
          
-        elif type(right) is (int or float):
+        elif _is_number(right):
             return self.__add__(-right)
         
         else:
@@ -288,9 +633,8 @@ class Sparse_Matrix:
     
     
     def __rsub__(self, left):
-        if type(left) is (int or float):
-            matrix = [(k[0], k[1], left - v) for k, v in self.matrix.items()]
-            return Sparse_Matrix(self.rows, self.cols, *matrix)
+        if _is_number(left):
+            return Sparse_Matrix._unchecked(self._rows, self._cols, _drop_zeros({k: left - v for k, v in self._matrix.items()}))
         
         else:
             return self.__sub__(left)
@@ -304,20 +648,20 @@ class Sparse_Matrix:
         Parameter:
         right (int, float, or Sparse_Matrix): operand to be multiplied with left operand'''
         if type(right) is Sparse_Matrix:
-            assert self.cols == right.rows, 'Sparse_Matrix.__mul__: Sparse_Matrix size(s) incompatible for *: ' + str(self.size()) + ' and ' + str(right.size())
+            assert self._cols == right._rows, 'Sparse_Matrix.__mul__: Sparse_Matrix size(s) incompatible for *: ' + str(self.size()) + ' and ' + str(right.size())
         
-            matrix = []
-            for r in range(self.rows):
-                for c in range(right.cols):
-                    value = 0
-                    for i in range(self.cols):
-                        value += (self.row(r)[i] * right.col(c)[i])
-                    matrix.append((r, c, value))
-            return Sparse_Matrix(self.rows, right.cols, *matrix)
+            indptr_c, ind_c, data_c = _spgemm(self._to_csr(), right._to_csr(), self._rows, right._cols, self._cols)
+            
+            # repeat each row index once per stored value in that row and zip it with the column indices and values
+            row_indices = chain.from_iterable(map(repeat, range(self._rows), map(sub, indptr_c[1:], indptr_c[:-1])))
+            matrix_dict = _drop_zeros(dict(zip(zip(row_indices, ind_c), data_c)))
+            return Sparse_Matrix._unchecked(self._rows, right._cols, matrix_dict)
         
-        elif type(right) is (int or float):
-            matrix = [(k[0], k[1], v * right) for k, v in self.matrix.items()]
-            return Sparse_Matrix(self.rows, self.cols, *matrix)
+        elif _is_number(right):
+            if right == 0:
+                return Sparse_Matrix._unchecked(self._rows, self._cols, {})
+            # a non-zero scalar only produces 0 values through float underflow
+            return Sparse_Matrix._unchecked(self._rows, self._cols, _drop_zeros({k: v * right for k, v in self._matrix.items()}))
         
         else:
             raise TypeError('Sparse_Matrix.__mul__: unsupported operand type(s) for *: ' + type_as_str(right) + ' and Sparse_Matrix')
@@ -332,17 +676,24 @@ class Sparse_Matrix:
         If type of right argument is not int, raises TypeError.
         If right argument is less than 1, raises AssertionError.
         If self.rows not equal to self.cols, raises AssertionError.
+        Values converted by astype to a small NumPy type (e.g., numpy.float32 or numpy.int16) lose precision or overflow quickly for large exponents.
         
         Parameter:
         right (int): non-negative integer representing exponent'''
         if type(right) is int:
             assert right > 0, 'Sparse_Matrix.__pow__: invalid operand (' + str(right) + ') for **: must be non-negative int'
-            assert self.rows == self.cols, 'Sparse_Matrix.__pow__: Sparse_Matrix size ' + str(self.size()) + ' incompatible for **: must have equal rows and columns'
+            assert self._rows == self._cols, 'Sparse_Matrix.__pow__: Sparse_Matrix size ' + str(self.size()) + ' incompatible for **: must have equal rows and columns'
             
-            pow_mat = self
-            for __ in range(1, right):
-                power = pow_mat.__mul__(self)
-                pow_mat = power
+            # exponentiation by squaring: base runs through self**1, self**2, self**4, ...; each set bit of right multiplies it into pow_mat
+            pow_mat = None
+            base = self
+            while True:
+                if right & 1:
+                    pow_mat = base if pow_mat is None else pow_mat.__mul__(base)
+                right >>= 1
+                if right == 0:
+                    break
+                base = base.__mul__(base)
         
             return pow_mat
             
@@ -359,33 +710,17 @@ class Sparse_Matrix:
         True: right argument (Sparse_Matrix) is same size and has same pair-wise values as self; or all values of self are equal to right argument (int or float)
         False: type of right argument is not int, float, or Sparse_Matrix; right argument (Sparse_Matrix) is different size or has different pair-wise values from self; or values of self are not equal to right argument (int or float)'''
         if type(right) is Sparse_Matrix:
-            if (right.size() == self.size()) and (right.details().split(' -> ')[2] == self.details().split(' -> ')[2]):
-                return True
+            # neither dict stores 0 values, so equal dicts means equal values at every index
+            return (right.size() == self.size()) and (right._matrix == self._matrix)
         
-        elif type(right) is (int or float):
-            if right == 0 and self.__bool__() is False:
-                return True
+        elif _is_number(right):
+            if right == 0:
+                return len(self._matrix) == 0
             
-            elif right != 0:
-                all_values = list(self.matrix.values())
-                if all_values.count(right) == self.__len__():
-                    return True
+            else:
+                return (len(self._matrix) == self.__len__()) and all(v == right for v in self._matrix.values())
 
         return False
-         
-    
-    def __setattr__(self, name, value):
-        '''Ensures that Sparse_Matrix does not store attributes other than: rows, cols, and matrix.
-        If attempt is made to add new attributes or re-bind existing attribute to Sparse_Matrix, raises AssertionError.
-        
-        Parameters:
-        name (str): namespace of attribute
-        value: attribute value'''
-        assert (name in ['rows', 'cols', 'matrix']) and (name not in self.__dict__), 'Sparse_Matrix.__setattr__: Sparse_Matrix object cannot store new attributes or re-bind existing attributes'
-        
-        if name in ['rows', 'cols', 'matrix']:
-            if name not in self.__dict__:
-                self.__dict__[name] = value
     
 
 if __name__ == '__main__':
@@ -415,6 +750,22 @@ if __name__ == '__main__':
     print('m == m: ' + str(m==m))
     print('m == 1: ' + str(m==1))
     
+    print('\nm+n where n stores values that m does not')
+    s = Sparse_Matrix(2,2, (0,0,1)) + Sparse_Matrix(2,2, (1,1,2))
+    print(s)
+    assert s == Sparse_Matrix(2,2, (0,0,1),(1,1,2)), 'Sparse_Matrix + Sparse_Matrix dropped values stored only in right operand'
+    
+    print('\nresize 3x3 to 3x2: drops only the value in column 2')
+    r = Sparse_Matrix(3,3, (0,0,1),(0,2,2),(2,1,3))
+    r(3,2)
+    print(r.details())
+    assert r == Sparse_Matrix(3,2, (0,0,1),(2,1,3)), 'Sparse_Matrix.__call__ kept or deleted the wrong values'
+    
+    print('\nfloat values')
+    f = Sparse_Matrix(2,2, (0,0,1.5),(1,1,2))
+    print(f)
+    assert f[0,0] == 1.5, 'Sparse_Matrix.__init__ rejected or changed a float value'
+    
     # print()
     # import driver
     # driver.default_file_name = 'bscp22W22.txt'